@@ -0,0 +1,140 @@
+"""
+Constants shared across commitgen: prompt text and precompiled patterns.
+"""
+import re
+
+# Patterns to skip low-value commits, fused into one alternation
+LOW_VALUE_RE = re.compile(
+    r"(?:add|remove) debug"
+    r"|(?:print|log)\s+statement"
+    r"|minor\s+(?:change|update)",
+    re.IGNORECASE,
+)
+
+# A Conventional Commits title line, and markdown emphasis models wrap it in
+COMMIT_LINE_RE = re.compile(
+    r"^(feat|fix|chore|docs|refactor|style|test|perf|build|ci)(\([\w\-./]+\))?!?: .+"
+)
+CLEAN_LINE_RE = re.compile(r"^\s*\*{0,2}(.*?)\*{0,2}\s*$")
+
+# Start of each file section in a diff. Both sides name the same path unless
+# the file was renamed, which the backreference uses to allow " b/" in paths;
+# for renames the second and third groups hold the old and new paths.
+DIFF_HEADER_RE = re.compile(r"^diff --git a/(?:(.+) b/\1|(.+?) b/(.+))$", re.MULTILINE)
+
+# Generated dependency lockfiles, whose contents are left out of prompts
+LOCKFILES = frozenset({
+    "Cargo.lock",
+    "Gemfile.lock",
+    "Pipfile.lock",
+    "composer.lock",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "poetry.lock",
+    "uv.lock",
+    "yarn.lock",
+})
+
+# Inputs to the local fast path for trivial diffs
+DOC_EXTENSIONS = (".md", ".rst")
+REQUIREMENT_RE = re.compile(
+    r"^([A-Za-z0-9][A-Za-z0-9._\-]*)(?:\[[^\]]*\])?\s*(?:[=~!<>]=?\s*([^\s;,#]+))?"
+)
+FUNCTION_DEF_RE = re.compile(r"^\s*(?:async\s+)?def (\w+)", re.MULTILINE)
+
+# Words compared when picking the few-shot examples closest to a diff
+WORD_RE = re.compile(r"[a-z_]+")
+
+# Exhaustive few-shot examples illustrating multi-file and edge cases
+FEW_SHOT_EXAMPLES = [
+    """
+Example 1: Simple addition
+Diff:
+--- a/src/math.py
++++ b/src/math.py
+@@ -1,1 +1,2 @@
+ def subtract(x, y):
+-    return x - y
++    return x - y
++
++def add(x, y):
++    return x + y
+Commit Message:
+feat(math): add add() helper function
+""",
+    """
+Example 2: Debugging statement
+Diff:
+--- a/src/auth.py
++++ b/src/auth.py
+@@ -10,3 +10,4 @@
+ def login(user, pass):
+     # ...
+     authenticate(user, pass)
++    print("User authenticated")
+Commit Message:
+chore(auth): add temporary debug log
+""",
+    """
+Example 3: Refactoring
+Diff:
+--- a/src/main.py
++++ b/src/main.py
+@@ -5,5 +5,5 @@
+-    logger.info("Starting app")
++    logger.debug("Starting app")
+     run()
+Commit Message:
+refactor(logging): change log level from info to debug
+""",
+    """
+Example 4: Multi-file change
+Diff:
+diff --git a/src/cli.py b/src/cli.py
+--- a/src/cli.py
++++ b/src/cli.py
+@@ -1,3 +1,3 @@
+ def run_cli():
+-    print("Running CLI tool")
++    # print("Running CLI tool")
+     parse_args()
+diff --git a/src/api.py b/src/api.py
+--- a/src/api.py
++++ b/src/api.py
+@@ -10,1 +10,1 @@
+-    return {"status": "ok"}
++    return {"status": "live"}
+Commit Message:
+refactor(cli): comment out debug print
+fix(api): correct status response from ok to live
+""",
+]
+
+# Precise, hygiene-enforced instructions, followed by the selected examples
+# in the system prompt
+INSTRUCTIONS = """Generate clear, accurate Git commit messages.
+
+You are a meticulous developer crafting Git commit messages in Conventional Commits format.
+
+- Your primary goal is to accurately describe the changes in the provided diff.
+- Use the format: <type>(<scope>): <summary>
+- The scope should be the name of the file or module most affected (e.g., "auth", "api", "cli").
+- For changes spanning multiple files, you may provide multiple commit lines.
+- Use "feat" for new features, "fix" for bug fixes, "refactor" for code changes that neither fix a bug nor add a feature, and "chore" for routine tasks.
+- Focus ONLY on the changes presented in the diff. Do not invent or generalize.
+"""
+
+# User message for a single diff; the instructions live in the system prompt
+USER_PROMPT_TEMPLATE = """
+Now, write the commit message for the following diff:
+{diff}
+"""
+
+# Instructions for split mode, where several files share one request
+BATCH_PROMPT = """
+Write one commit message for each file in the JSON array below.
+Reply with a JSON object of the form
+{"messages": [{"id": <file id>, "title": ..., "body": ...}, ...]}
+containing one entry per file.
+
+"""
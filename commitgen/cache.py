@@ -0,0 +1,90 @@
+"""
+Persistent LRU cache of generated commit messages.
+
+Entries are keyed by a hash of everything that influences the LLM output,
+so repeated runs on the same staged changes skip the network entirely.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "commitgen"
+CACHE_PATH = CACHE_DIR / "messages.sqlite3"
+MAX_ENTRIES = 1000
+
+# Cleared by --no-cache to bypass both lookups and stores
+enabled = True
+
+# In-process layer in front of the on-disk store
+_memory: dict[str, tuple[str, str]] = {}
+_connection: Optional[sqlite3.Connection] = None
+
+
+def make_key(*parts: object) -> str:
+    """
+    Hash the given request parts into a compact cache key.
+    """
+    data = "\0".join(str(part) for part in parts).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    Open the cache database on first use, creating it if needed.
+    """
+    global _connection
+    if _connection is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _connection = sqlite3.connect(CACHE_PATH)
+        _connection.execute(
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "key TEXT PRIMARY KEY, title TEXT NOT NULL, body TEXT NOT NULL, used REAL NOT NULL)"
+        )
+    return _connection
+
+
+def get(key: str) -> Optional[tuple[str, str]]:
+    """
+    Return the cached (title, body) for a key, or None on a miss.
+    """
+    if not enabled:
+        return None
+    if key in _memory:
+        return _memory[key]
+    try:
+        db = _connect()
+        row = db.execute("SELECT title, body FROM messages WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with db:
+            db.execute("UPDATE messages SET used = ? WHERE key = ?", (time.time(), key))
+    except (OSError, sqlite3.Error):
+        return None
+    _memory[key] = (row[0], row[1])
+    return _memory[key]
+
+
+def put(key: str, value: tuple[str, str]) -> None:
+    """
+    Store a (title, body) pair, evicting the least recently used entries.
+    """
+    if not enabled:
+        return
+    _memory[key] = value
+    try:
+        db = _connect()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO messages (key, title, body, used) VALUES (?, ?, ?, ?)",
+                (key, value[0], value[1], time.time()),
+            )
+            db.execute(
+                "DELETE FROM messages WHERE key NOT IN "
+                "(SELECT key FROM messages ORDER BY used DESC LIMIT ?)",
+                (MAX_ENTRIES,),
+            )
+    except (OSError, sqlite3.Error):
+        pass
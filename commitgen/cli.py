@@ -3,118 +3,358 @@
 Interactive CLI to auto-generate Git commit messages
 using Conventional Commits format via an LLM.
 """
+import asyncio
+import functools
+import heapq
+import json
+import logging
+import math
 import os
-import re
 import subprocess
+import sys
 import tempfile
+from collections import Counter
+from typing import Optional
 
 typer_import_error = None
 try:
     import typer
 except ImportError as e:
     typer_import_error = e
-from dotenv import load_dotenv
-from openai import OpenAI
 
-# Ensure environment variables are loaded
-load_dotenv()
+from commitgen import cache
+from commitgen._constants import (
+    BATCH_PROMPT,
+    CLEAN_LINE_RE,
+    COMMIT_LINE_RE,
+    DIFF_HEADER_RE,
+    DOC_EXTENSIONS,
+    FEW_SHOT_EXAMPLES,
+    FUNCTION_DEF_RE,
+    INSTRUCTIONS,
+    LOCKFILES,
+    LOW_VALUE_RE,
+    REQUIREMENT_RE,
+    USER_PROMPT_TEMPLATE,
+    WORD_RE,
+)
 
 # Initialize CLI app
 cli_app = typer.Typer(help="Generate precise Git commit messages via AI")
 
-# Configure OpenAI (Groq) client
-api_key = os.getenv("GROQ_API_KEY")
-if not api_key:
-    raise RuntimeError("GROQ_API_KEY not set in environment.")
-client = OpenAI(api_key=api_key, base_url="https://api.groq.com/openai/v1")
-
-# Patterns to skip low-value commits
-LOW_VALUE_PATTERNS = [
-    re.compile(r"(add|remove) debug", re.IGNORECASE),
-    re.compile(r"(print|log)\s+statement", re.IGNORECASE),
-    re.compile(r"minor\s+(change|update)", re.IGNORECASE),
-]
-
-# Exhaustive few-shot examples illustrating multi-file and edge cases
-FEW_SHOT_EXAMPLES = """
-Example 1: Simple addition
-Diff:
---- a/src/math.py
-+++ b/src/math.py
-@@ -1,1 +1,2 @@
- def subtract(x, y):
--    return x - y
-+    return x - y
-+
-+def add(x, y):
-+    return x + y
-Commit Message:
-feat(math): add add() helper function
-
-Example 2: Debugging statement
-Diff:
---- a/src/auth.py
-+++ b/src/auth.py
-@@ -10,3 +10,4 @@
- def login(user, pass):
-     # ...
-     authenticate(user, pass)
-+    print("User authenticated")
-Commit Message:
-chore(auth): add temporary debug log
-
-Example 3: Refactoring
-Diff:
---- a/src/main.py
-+++ b/src/main.py
-@@ -5,5 +5,5 @@
--    logger.info("Starting app")
-+    logger.debug("Starting app")
-     run()
-Commit Message:
-refactor(logging): change log level from info to debug
-
-Example 4: Multi-file change
-Diff:
-diff --git a/src/cli.py b/src/cli.py
---- a/src/cli.py
-+++ b/src/cli.py
-@@ -1,3 +1,3 @@
- def run_cli():
--    print("Running CLI tool")
-+    # print("Running CLI tool")
-     parse_args()
-diff --git a/src/api.py b/src/api.py
---- a/src/api.py
-+++ b/src/api.py
-@@ -10,1 +10,1 @@
--    return {"status": "ok"}
-+    return {"status": "live"}
-Commit Message:
-refactor(cli): comment out debug print
-fix(api): correct status response from ok to live
-"""
+logger = logging.getLogger(__name__)
+
+# Sampling temperature; part of the cache key
+TEMPERATURE = 0.2
+
+# Number of suggestions offered before giving up on a diff
+MAX_ATTEMPTS = 3
+
+# Seconds before a stalled LLM request is abandoned, and retries after that
+REQUEST_TIMEOUT = 15.0
+MAX_RETRIES = 3
+
+# Prompt budget: changed lines and bytes kept per file, and estimated tokens overall
+MAX_LINES_PER_FILE = 80
+MAX_FILE_BYTES = 200 * 1024
+TARGET_TOKENS = 3000
+
+# Context window of the default model, and files sent in one split-mode request
+MODEL_CONTEXT_TOKENS = 8192
+MAX_FILES_PER_BATCH = 10
+
+# Few-shot examples sent with each request, picked by similarity to the diff
+EXAMPLES_PER_PROMPT = 2
+
+# Read-only git calls must not contend for the index lock
+GIT_ENV = {**os.environ, "GIT_OPTIONAL_LOCKS": "0"}
 
 
 def get_full_staged_diff() -> str:
     """
-    Capture the current staged Git diff as a string.
+    Stream the current staged Git diff into a string.
+    At most MAX_LINES_PER_FILE changed lines (and MAX_FILE_BYTES) are kept per
+    file, and none for lockfiles, so a huge diff is never held in memory whole.
     Returns empty string if no staged changes.
     """
-    result = subprocess.run(
-        ["git", "diff", "--cached"],
-        capture_output=True,
-        text=True,
-        encoding="utf-8",
+    process = subprocess.Popen(
+        # Pin the output format that split_diff_by_file expects, whatever the user's config
+        [
+            "git", "-c", "core.quotePath=false", "diff", "--cached", "--unified=0",
+            "--no-color", "--no-ext-diff", "--src-prefix=a/", "--dst-prefix=b/",
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=GIT_ENV,
+        bufsize=64 * 1024,
     )
-    return result.stdout if result.returncode == 0 else ""
+    kept: list[bytes] = []
+    changed = size = truncated = 0
+    limit = MAX_LINES_PER_FILE
+    in_hunk = False
+    for line in process.stdout:
+        if line.startswith(b"diff --git "):
+            if truncated:
+                kept.append(b"[truncated %d lines]\n" % truncated)
+            changed = size = truncated = 0
+            in_hunk = False
+            # Lockfile contents say nothing useful about a change; keep only the header
+            name = line.rstrip(b"\n").rsplit(b"/", 1)[-1].decode("utf-8", "replace")
+            limit = 0 if name in LOCKFILES else MAX_LINES_PER_FILE
+        elif line.startswith(b"@@"):
+            in_hunk = True
+        elif in_hunk and line.startswith((b"+", b"-")):
+            if truncated or changed >= limit or size + len(line) > MAX_FILE_BYTES:
+                truncated += 1
+                continue
+            changed += 1
+            size += len(line)
+        if not truncated:
+            kept.append(line)
+    if truncated:
+        kept.append(b"[truncated %d lines]\n" % truncated)
+    process.stdout.close()
+    if process.wait() != 0:
+        return ""
+    # Decode once instead of running the universal-newlines translation
+    return b"".join(kept).decode("utf-8", "replace")
+
+
+def split_diff_by_file(diff: str) -> dict[str, str]:
+    """
+    Split a full diff into one entry per file, in a single pass over the text.
+    """
+    headers = list(DIFF_HEADER_RE.finditer(diff))
+    files: dict[str, str] = {}
+    for i, match in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(diff)
+        files[match.group(1) or match.group(3)] = diff[match.start():end]
+    return files
+
+
+def file_paths(file_diff: str) -> list[str]:
+    """
+    Return the paths a file's diff touches: the old and new path for a rename,
+    otherwise just the one path.
+    """
+    match = DIFF_HEADER_RE.match(file_diff)
+    if match is None:
+        return []
+    if match.group(1):
+        return [match.group(1)]
+    if "\nrename from " in file_diff:
+        return [match.group(2), match.group(3)]
+    return [match.group(3)]
+
+
+def shrink_diff(diff: str, target_tokens: int = TARGET_TOKENS) -> str:
+    """
+    Reduce a diff to fit the prompt budget (estimated at 4 chars per token).
+    Keeps only changed lines and caps each file. While over budget, trailing
+    hunks are dropped from the files with the most hunks, then whole files are
+    dropped, those with the fewest changes first, and finally trailing lines
+    of the largest hunks and the tails of overlong lines are cut.
+    """
+    files = split_diff_by_file(diff)
+    if not files:
+        return diff
+
+    sections: list[dict] = []
+    for file_diff in files.values():
+        header: list[str] = []
+        hunks: list[list[str]] = []
+        changed = truncated = 0
+        for line in file_diff.splitlines():
+            if line.startswith("@@"):
+                hunks.append([line])
+            elif not hunks:
+                if not line.startswith("index "):
+                    header.append(line)
+            elif line.startswith("[truncated "):
+                # Already cut while reading the diff
+                truncated += int(line.split()[1])
+            elif line.startswith(("+", "-")):
+                changed += 1
+                if changed <= MAX_LINES_PER_FILE:
+                    hunks[-1].append(line)
+        sections.append({
+            "header": header,
+            "hunks": [hunk for hunk in hunks if len(hunk) > 1],
+            "changed": changed + truncated,
+            "truncated": truncated + max(changed - MAX_LINES_PER_FILE, 0),
+            "dropped_hunks": 0,
+            "clipped": 0,
+        })
+
+    def size(lines: list[str]) -> int:
+        return sum(len(line) + 1 for line in lines)
+
+    def markers(section: dict) -> list[str]:
+        lines = []
+        if section["truncated"]:
+            lines.append(f"[truncated {section['truncated']} lines]")
+        if section["dropped_hunks"]:
+            lines.append(f"[diff truncated {section['dropped_hunks']} hunks]")
+        if section["clipped"]:
+            lines.append(f"[clipped {section['clipped']} long lines]")
+        return lines
+
+    def weight(section: dict) -> int:
+        return section["size"] + size(markers(section))
+
+    def omitted(count: int) -> list[str]:
+        return [f"[omitted {count} files with fewer changes]"] if count else []
+
+    # Sizes are tracked incrementally and include the markers, so the result fits the budget
+    for section in sections:
+        section["size"] = size(section["header"]) + sum(size(h) for h in section["hunks"])
+    budget = target_tokens * 4
+    total = sum(weight(section) for section in sections)
+    while total > budget:
+        largest = max(sections, key=lambda section: len(section["hunks"]))
+        if len(largest["hunks"]) <= 1:
+            break
+        before = weight(largest)
+        largest["size"] -= size(largest["hunks"].pop())
+        largest["dropped_hunks"] += 1
+        total += weight(largest) - before
+
+    dropped = 0
+    for section in sorted(sections, key=lambda section: section["changed"]):
+        if total + size(omitted(dropped)) <= budget or len(sections) - dropped == 1:
+            break
+        section["omitted"] = True
+        total -= weight(section)
+        dropped += 1
+    sections = [section for section in sections if not section.get("omitted")]
+    total += size(omitted(dropped))
+
+    # Trim trailing lines from the largest hunks, keeping at least one changed line each
+    heap = [
+        (-size(hunk), i, j)
+        for i, section in enumerate(sections)
+        for j, hunk in enumerate(section["hunks"])
+        if len(hunk) > 2
+    ]
+    heapq.heapify(heap)
+    while total > budget and heap:
+        key, i, j = heapq.heappop(heap)
+        section = sections[i]
+        hunk = section["hunks"][j]
+        before = weight(section)
+        removed = len(hunk.pop()) + 1
+        section["size"] -= removed
+        section["truncated"] += 1
+        total += weight(section) - before
+        if len(hunk) > 2:
+            heapq.heappush(heap, (key + removed, i, j))
+
+    # Only one changed line per hunk is left, so clip those
+    for section in sections:
+        for hunk in section["hunks"]:
+            excess = total - budget
+            if excess <= 0 or len(hunk[-1]) <= 1:
+                continue
+            before = weight(section)
+            section["clipped"] += 1
+            growth = weight(section) - before
+            keep = max(len(hunk[-1]) - excess - growth, 1)
+            section["size"] -= len(hunk[-1]) - keep
+            hunk[-1] = hunk[-1][:keep]
+            total += weight(section) - before
+
+    parts: list[str] = []
+    for section in sections:
+        parts += section["header"]
+        for hunk in section["hunks"]:
+            parts += hunk
+        parts += markers(section)
+    parts += omitted(dropped)
+    shrunk = "\n".join(parts) + "\n"
+    if dropped:
+        typer.echo(f"✂️ Omitted {dropped} file(s) from the prompt to fit the budget.", err=True)
+    return shrunk
+
+
+def parse_hunks(file_diff: str) -> list[tuple[list[str], list[str]]]:
+    """
+    Return the removed and added lines of each hunk in a single file's diff.
+    """
+    hunks: list[tuple[list[str], list[str]]] = []
+    for line in file_diff.splitlines():
+        if line.startswith("@@"):
+            hunks.append(([], []))
+        elif hunks and line.startswith("-"):
+            hunks[-1][0].append(line[1:])
+        elif hunks and line.startswith("+"):
+            hunks[-1][1].append(line[1:])
+    return hunks
+
+
+def file_scope(path: str) -> str:
+    """
+    Derive a commit scope from a file path, e.g. "src/auth.py" -> "auth".
+    """
+    return os.path.splitext(os.path.basename(path))[0].lower()
+
+
+def classify_locally(diff: str) -> Optional[tuple[str, str]]:
+    """
+    Describe trivial diffs without calling the LLM: lockfile-only updates,
+    whitespace-only edits, docs-only changes, a single added or bumped
+    requirement, and a single new Python function. Returns None when no rule applies.
+    """
+    files = split_diff_by_file(diff)
+    if not files:
+        return None
+    names = {os.path.basename(path) for path in files}
+    if names <= LOCKFILES:
+        return f"chore(deps): update {', '.join(sorted(names))}", ""
+    if "\n[truncated " in diff or "\n[clipped " in diff:
+        return None
+    hunks = {path: parse_hunks(file_diff) for path, file_diff in files.items()}
+    # Binary files, pure renames and mode changes have no hunks to judge by
+    if not all(hunks.values()):
+        return None
+    paths = list(files)
+    single = paths[0] if len(paths) == 1 else None
+
+    def squash(lines: list[str]) -> list[str]:
+        return ["".join(line.split()) for line in lines if line.strip()]
+
+    if all(squash(removed) == squash(added) for h in hunks.values() for removed, added in h):
+        return (f"style({file_scope(single)})" if single else "style") + ": fix whitespace", ""
+
+    if all(path.lower().endswith(DOC_EXTENSIONS) for path in paths):
+        if single:
+            return f"docs({file_scope(single)}): update {os.path.basename(single)}", ""
+        return "docs: update documentation", "\n".join(f"- {path}" for path in paths)
+
+    if not single or len(hunks[single]) != 1:
+        return None
+    removed, added = hunks[single][0]
+    name = os.path.basename(single)
+
+    if name.startswith("requirements") and name.endswith(".txt") and len(added) == 1:
+        new = REQUIREMENT_RE.match(added[0].strip())
+        old = REQUIREMENT_RE.match(removed[0].strip()) if len(removed) == 1 else None
+        if new and not removed:
+            return f"chore(deps): add {new.group(1)}", ""
+        if new and old and new.group(2) and old.group(1).lower() == new.group(1).lower():
+            return f"chore(deps): bump {new.group(1)} to {new.group(2)}", ""
+
+    if name.endswith(".py") and not removed:
+        functions = FUNCTION_DEF_RE.findall("\n".join(added))
+        if len(functions) == 1:
+            return f"feat({file_scope(single)}): add {functions[0]}()", ""
+    return None
 
 
 def is_low_value_commit(title: str) -> bool:
     """
     Check if the suggested commit title matches low-value patterns.
     """
-    return any(p.search(title) for p in LOW_VALUE_PATTERNS)
+    return LOW_VALUE_RE.search(title) is not None
 
 def add(x: int, y: int) -> int:
     """
@@ -122,48 +362,298 @@ def add(x: int, y: int) -> int:
     """
     return x + y
 
-def query_commit_message(diff: str, model: str = "llama3-8b-8192") -> tuple[str, str]:
+@functools.lru_cache(maxsize=1)
+def get_client():
     """
-    Send the diff to the LLM and parse back a title and optional body.
+    Build the OpenAI (Groq) client on first use.
+    openai, httpx and dotenv are imported here so --help and early exits skip them.
+    """
+    import httpx
+    from dotenv import load_dotenv
+    from openai import AsyncOpenAI
+
+    # Ensure environment variables are loaded
+    load_dotenv()
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise RuntimeError("GROQ_API_KEY not set in environment.")
+
+    # A single HTTP/2 connection is shared by all concurrent requests
+    http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    )
+    # Timeouts belong on AsyncOpenAI: the SDK sends its own per-request timeout,
+    # which overrides any set on http_client. It also retries connection
+    # errors, 429s and 5xx with exponential backoff.
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url="https://api.groq.com/openai/v1",
+        http_client=http_client,
+        timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=3.0),
+        max_retries=MAX_RETRIES,
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def request_slots() -> asyncio.Semaphore:
+    """
+    Limit concurrent LLM requests to COMMITGEN_MAX_CONCURRENCY (default 16).
+    Created on first use so it binds to the running event loop.
     """
-    # Build a precise, hygiene-enforced prompt
-    prompt = f"""
-You are a meticulous developer crafting Git commit messages in Conventional Commits format.
+    value = os.getenv("COMMITGEN_MAX_CONCURRENCY", "16")
+    try:
+        limit = int(value)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        logger.warning("Invalid COMMITGEN_MAX_CONCURRENCY %r, using 16", value)
+        limit = 16
+    return asyncio.Semaphore(limit)
 
-- Your primary goal is to accurately describe the changes in the provided diff.
-- Use the format: <type>(<scope>): <summary>
-- The scope should be the name of the file or module most affected (e.g., "auth", "api", "cli").
-- For changes spanning multiple files, you may provide multiple commit lines.
-- Use "feat" for new features, "fix" for bug fixes, "refactor" for code changes that neither fix a bug nor add a feature, and "chore" for routine tasks.
-- Focus ONLY on the changes presented in the diff. Do not invent or generalize.
 
-{FEW_SHOT_EXAMPLES}
+def word_counts(text: str) -> Counter:
+    """
+    Count the lowercase words in a piece of text.
+    """
+    return Counter(WORD_RE.findall(text.lower()))
 
-Now, write the commit message for the following diff:
-{diff}
-"""
 
-    # Debug: print prompt to logs
-    print("--- LLM Prompt Begin ---")
-    print(prompt)
-    print("--- LLM Prompt End ---")
+EXAMPLE_COUNTS = [word_counts(example) for example in FEW_SHOT_EXAMPLES]
 
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": "Generate clear, accurate Git commit messages."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
-        max_tokens=300,
+
+def similarity(a: Counter, b: Counter) -> float:
+    """
+    Cosine similarity of two word-count vectors.
+    """
+    dot = sum(count * b[word] for word, count in a.items() if word in b)
+    norm = math.sqrt(sum(v * v for v in a.values()) * sum(v * v for v in b.values()))
+    return dot / norm if norm else 0.0
+
+
+@functools.lru_cache(maxsize=None)
+def build_system_prompt(examples: tuple[int, ...]) -> str:
+    """
+    Join the instructions with the chosen few-shot examples.
+    """
+    return INSTRUCTIONS + "".join(FEW_SHOT_EXAMPLES[i] for i in examples)
+
+
+def system_prompt_for(diff: str) -> str:
+    """
+    Build the system prompt with the few-shot examples closest to the diff.
+    Each selection always yields the same string, so providers can still
+    reuse their cached prefix across requests.
+    """
+    counts = word_counts(diff)
+    ranked = sorted(
+        range(len(FEW_SHOT_EXAMPLES)),
+        key=lambda i: similarity(counts, EXAMPLE_COUNTS[i]),
+        reverse=True,
     )
-    content = response.choices[0].message.content.strip()
-    lines = content.split("\n", 1)
-    title = lines[0].strip()
-    body = lines[1].strip() if len(lines) > 1 else ""
+    return build_system_prompt(tuple(sorted(ranked[:EXAMPLES_PER_PROMPT])))
+
+
+def parse_commit_message(content: str) -> tuple[str, str]:
+    """
+    Split an LLM reply into title and body.
+    The title is the first Conventional Commits line, ignoring any preamble;
+    if there is none, the first line is used.
+    """
+    lines = content.strip().splitlines()
+    for i, line in enumerate(lines):
+        cleaned = CLEAN_LINE_RE.match(line).group(1)
+        if COMMIT_LINE_RE.match(cleaned):
+            return cleaned, "\n".join(lines[i + 1:]).strip()
+    if not lines:
+        return "", ""
+    return CLEAN_LINE_RE.match(lines[0]).group(1), "\n".join(lines[1:]).strip()
+
+
+def build_prompt(diff: str) -> str:
+    """
+    Build the user message for a single, already shrunk, diff.
+    """
+    return USER_PROMPT_TEMPLATE.format(diff=diff)
+
+
+async def query_commit_message(
+    diff: str, model: str = "llama3-8b-8192", attempt: int = 0, echo: bool = False
+) -> tuple[str, str]:
+    """
+    Send the diff to the LLM and parse back a title and optional body.
+    Results are cached per attempt, so regenerating still yields a new suggestion.
+    With echo, tokens are printed as they stream in.
+    Trivial diffs are classified locally on the first attempt.
+    """
+    if attempt == 0:
+        local = classify_locally(diff)
+        if local is not None:
+            return local
+
+    shrunk = shrink_diff(diff)
+    system_prompt = system_prompt_for(shrunk)
+    prompt = build_prompt(shrunk)
+    key = cache.make_key(model, TEMPERATURE, system_prompt, prompt, attempt)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    logger.debug("LLM prompt:\n%s", prompt)
+
+    parts: list[str] = []
+    async with request_slots():
+        stream = await get_client().chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ],
+            temperature=TEMPERATURE,
+            max_tokens=300,
+            stream=True,
+        )
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            parts.append(delta)
+            if echo:
+                typer.secho(delta, nl=False, dim=True)
+    if echo:
+        typer.echo()
+    title, body = parse_commit_message("".join(parts))
+    cache.put(key, (title, body))
     return title, body
 
 
+async def query_batch(batch: dict[str, str], model: str) -> dict[str, tuple[str, str]]:
+    """
+    Ask for one message per file in a single JSON-mode request.
+    Files are referred to by numeric id, so paths never have to be echoed back.
+    Files missing from the reply, an unparsable reply, or a failed request
+    leave files out of the result, so the caller falls back to single-file requests.
+    """
+    from openai import APIError
+
+    paths = list(batch)
+    files = [{"id": i, "file": path, "diff": batch[path]} for i, path in enumerate(paths, 1)]
+    system_prompt = system_prompt_for("".join(batch.values()))
+    prompt = BATCH_PROMPT + json.dumps(files)
+    logger.debug("LLM batch prompt for %d files:\n%s", len(files), prompt)
+    # Leave the reply whatever the prompt does not use of the context window
+    room = MODEL_CONTEXT_TOKENS - (len(system_prompt) + len(prompt)) // 4 - 100
+    max_tokens = min(200 * len(batch) + 100, room)
+    if max_tokens < 100:
+        return {}
+    try:
+        async with request_slots():
+            response = await get_client().chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                temperature=TEMPERATURE,
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+            )
+    except APIError as e:
+        logger.debug("Batch request failed, falling back to single files: %s", e)
+        return {}
+    try:
+        data = json.loads(response.choices[0].message.content)
+    except (TypeError, ValueError):
+        return {}
+    entries = data.get("messages") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        return {}
+
+    messages: dict[str, tuple[str, str]] = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get("title"):
+            continue
+        number = entry.get("id")
+        if isinstance(number, str) and number.isdigit():
+            number = int(number)
+        # bool is an int subclass, and ids outside 1..n would wrap or miss
+        if type(number) is not int or not 1 <= number <= len(paths):
+            continue
+        path = paths[number - 1]
+        # Models sometimes put the whole message, body included, in the title
+        title, rest = parse_commit_message(str(entry["title"]))
+        if not title:
+            continue
+        messages[path] = (title, str(entry.get("body") or "").strip() or rest)
+    return messages
+
+
+async def query_commit_messages(
+    files: dict[str, str], model: str = "llama3-8b-8192"
+) -> dict[str, tuple[str, str]]:
+    """
+    Generate one message per file, packing uncached files into as few requests
+    as the prompt budget allows. Files with identical changes share one answer.
+    Files a batch fails to cover are retried one by one.
+    """
+    results: dict[str, tuple[str, str]] = {}
+    keys: dict[str, str] = {}
+    # Representative path -> other paths whose changes are byte-identical
+    copies: dict[str, list[str]] = {}
+    seen: dict[str, str] = {}
+    batches: list[dict[str, str]] = [{}]
+    size = 0
+    for path, file_diff in files.items():
+        local = classify_locally(file_diff)
+        if local is not None:
+            results[path] = local
+            continue
+        shrunk = shrink_diff(file_diff)
+        keys[path] = cache.make_key(
+            model, TEMPERATURE, system_prompt_for(shrunk), build_prompt(shrunk), 0
+        )
+        cached = cache.get(keys[path])
+        if cached is not None:
+            results[path] = cached
+            continue
+        # Compare from the first hunk on, since headers always name the file,
+        # and only within a scope, since the title names it
+        _, has_hunks, changes = shrunk.partition("\n@@")
+        if has_hunks:
+            digest = cache.make_key(file_scope(path), changes)
+            if digest in seen:
+                copies[seen[digest]].append(path)
+                continue
+            seen[digest] = path
+        copies[path] = []
+        if batches[-1] and (
+            size + len(shrunk) > TARGET_TOKENS * 4 or len(batches[-1]) >= MAX_FILES_PER_BATCH
+        ):
+            batches.append({})
+            size = 0
+        batches[-1][path] = shrunk
+        size += len(shrunk)
+    batches = [batch for batch in batches if batch]
+
+    with typer.progressbar(length=len(copies), label="Generating") as progress:
+        tasks = [asyncio.create_task(query_batch(batch, model)) for batch in batches]
+        for task, batch in zip(tasks, batches):
+            task.add_done_callback(lambda _, n=len(batch): progress.update(n))
+        for generated in await asyncio.gather(*tasks):
+            for path, message in generated.items():
+                cache.put(keys[path], message)
+                results[path] = message
+
+    missing = [path for path in copies if path not in results]
+    fallback = await asyncio.gather(*(query_commit_message(files[path]) for path in missing))
+    results.update(zip(missing, fallback))
+    for path, others in copies.items():
+        for other in others:
+            cache.put(keys[other], results[path])
+            results[other] = results[path]
+    return {path: results[path] for path in files}
+
+
 def confirm_commit(title: str, body: str) -> str:
     """
     Display the generated title and body, and ask user to confirm, regenerate, or skip.
@@ -173,56 +663,179 @@ def confirm_commit(title: str, body: str) -> str:
     if body:
         typer.echo("\n📄 Suggested Commit Body:")
         typer.echo(body)
-    choice = typer.prompt(
-        "\nUse this commit message? (y = yes, r = regenerate, s = skip)",
-        default="y",
-    )
-    return choice.lower()
+    return read_choice("\nUse this commit message? (y = yes, r = regenerate, s = skip)", "y")
 
 
-def make_commit(title: str, body: str) -> None:
+def read_choice(prompt: str, default: str) -> str:
     """
-    Write the title and body to a tempfile and invoke 'git commit'.
+    Read a single keystroke, without waiting for Enter.
+    Falls back to a line prompt when stdin is not a terminal.
     """
-    with tempfile.NamedTemporaryFile(mode="w+", delete=False) as f:
-        if body:
-            f.write(f"{title}\n\n{body}")
-        else:
-            f.write(title)
-        f.flush()
-        subprocess.run(["git", "commit", "-F", f.name])
+    if not sys.stdin.isatty():
+        return typer.prompt(prompt, default=default).lower()
+    typer.echo(f"{prompt} [{default}]: ", nl=False)
+    choice = typer.getchar().lower()
+    if choice in ("\r", "\n"):
+        choice = default
+    typer.echo(choice)
+    return choice
 
 
-@cli_app.command()
-def generate():
+def make_commit(title: str, body: str, paths: Optional[list[str]] = None) -> None:
     """
-    Main command: generate and optionally apply a commit message.
+    Pipe the title and body to 'git commit' on stdin.
+    When paths are given, only the staged changes to those files are committed:
+    they are applied to a temporary index seeded from HEAD, so unstaged edits
+    and other staged files stay out of the commit.
+    Raises CalledProcessError if git refuses the commit.
     """
-    diff = get_full_staged_diff()
-    if not diff.strip():
-        typer.secho("⚠️ No staged changes detected.", fg=typer.colors.RED)
-        raise typer.Exit()
+    message = f"{title}\n\n{body}" if body else title
+    if not paths:
+        subprocess.run(
+            ["git", "commit", "-F", "-"], input=message, text=True, encoding="utf-8", check=True
+        )
+        return
 
-    for _ in range(3):
-        title, body = query_commit_message(diff)
+    top = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    patch = subprocess.run(
+        [
+            "git", "diff", "--cached", "--binary", "--no-color", "--no-ext-diff",
+            "--src-prefix=a/", "--dst-prefix=b/", "--", *(f":(literal){path}" for path in paths),
+        ],
+        cwd=top,
+        capture_output=True,
+        check=True,
+    ).stdout
+    has_head = subprocess.run(
+        ["git", "rev-parse", "--verify", "-q", "HEAD"], cwd=top, capture_output=True
+    ).returncode == 0
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, "GIT_INDEX_FILE": os.path.join(tmp, "index")}
+        subprocess.run(
+            ["git", "read-tree", "HEAD" if has_head else "--empty"], cwd=top, env=env, check=True
+        )
+        subprocess.run(
+            ["git", "apply", "--cached"], input=patch, cwd=top, env=env, check=True
+        )
+        subprocess.run(
+            ["git", "commit", "-F", "-"],
+            input=message.encode("utf-8"),
+            cwd=top,
+            env=env,
+            check=True,
+        )
+
+
+async def review_message(
+    diff: str, suggestion: Optional[tuple[str, str]] = None
+) -> Optional[tuple[str, str]]:
+    """
+    Offer suggestions for a diff until the user accepts, skips, or runs out of attempts.
+    Once the user has asked to regenerate, the next candidate is fetched in the
+    background while they are deciding.
+    Returns the accepted (title, body), or None.
+    """
+    loop = asyncio.get_running_loop()
+    if suggestion is None:
+        suggestion = await query_commit_message(diff, echo=True)
+
+    for attempt in range(MAX_ATTEMPTS):
+        title, body = suggestion
         if is_low_value_commit(title):
             typer.secho("⏭️ Detected low-value commit. Skipping.", fg=typer.colors.YELLOW)
-            raise typer.Exit()
+            return None
+
+        pending = None
+        if 0 < attempt < MAX_ATTEMPTS - 1:
+            pending = asyncio.create_task(query_commit_message(diff, attempt=attempt + 1))
 
-        choice = confirm_commit(title, body)
+        choice = await loop.run_in_executor(None, confirm_commit, title, body)
+        if choice in ("y", "s") and pending:
+            pending.cancel()
         if choice == "y":
-            make_commit(title, body)
-            typer.secho("✅ Commit created successfully!", fg=typer.colors.GREEN)
-            return
+            return title, body
         elif choice == "s":
             typer.secho("❌ Commit skipped.", fg=typer.colors.RED)
-            return
+            return None
         else:
             typer.secho("🔁 Regenerating commit message...", fg=typer.colors.YELLOW)
+            if pending:
+                suggestion = await pending
+            elif attempt + 1 < MAX_ATTEMPTS:
+                suggestion = await query_commit_message(diff, attempt=attempt + 1, echo=True)
 
     typer.secho(
         "⚠️ Maximum retries reached. Aborting commit.", fg=typer.colors.RED
     )
+    return None
+
+
+async def run_generate(diff: str, squash: bool) -> None:
+    """
+    Generate suggestions for the whole diff, or concurrently for each staged file.
+    In split mode every file is reviewed first, then the accepted commits are
+    made back to back.
+    """
+    try:
+        if squash:
+            accepted = await review_message(diff)
+            if accepted:
+                try:
+                    make_commit(*accepted)
+                except subprocess.CalledProcessError as e:
+                    typer.secho("❌ git commit failed.", fg=typer.colors.RED)
+                    raise typer.Exit(e.returncode)
+                typer.secho("✅ Commit created successfully!", fg=typer.colors.GREEN)
+            return
+
+        files = split_diff_by_file(diff)
+        if not files:
+            typer.secho("❌ Could not parse the staged diff.", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        results = await query_commit_messages(files)
+        commits: list[tuple[str, str, str, list[str]]] = []
+        for path, file_diff in files.items():
+            typer.secho(f"\n📁 {path}", bold=True)
+            accepted = await review_message(file_diff, results[path])
+            if accepted:
+                commits.append((path, *accepted, file_paths(file_diff)))
+        for path, title, body, paths in commits:
+            try:
+                make_commit(title, body, paths)
+            except subprocess.CalledProcessError as e:
+                typer.secho(f"❌ git commit failed for {path}.", fg=typer.colors.RED)
+                raise typer.Exit(e.returncode)
+        if commits:
+            typer.secho(f"✅ Created {len(commits)} commit(s).", fg=typer.colors.GREEN)
+    finally:
+        if get_client.cache_info().currsize:
+            await get_client().close()
+
+
+@cli_app.command()
+def generate(
+    squash: bool = typer.Option(
+        True, "--squash/--split", help="One commit for all staged files, or one per file."
+    ),
+    no_cache: bool = typer.Option(
+        False, "--no-cache", help="Always ask the LLM instead of reusing cached messages."
+    ),
+):
+    """
+    Main command: generate and optionally apply a commit message.
+    Set COMMITGEN_LOG=DEBUG to log the prompts sent to the LLM.
+    """
+    level = logging.getLevelName(os.environ.get("COMMITGEN_LOG", "WARNING").upper())
+    logging.basicConfig(level=level if isinstance(level, int) else logging.WARNING)
+    cache.enabled = not no_cache
+    diff = get_full_staged_diff()
+    if not diff.strip():
+        typer.secho("⚠️ No staged changes detected.", fg=typer.colors.RED)
+        raise typer.Exit()
+
+    asyncio.run(run_generate(diff, squash))
 
 
 if __name__ == "__main__":
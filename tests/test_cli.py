@@ -0,0 +1,92 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from commitgen import cli
+
+
+def file_diff(path: str, *lines: str) -> str:
+    return f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -1 +1 @@\n" + "".join(
+        f"{line}\n" for line in lines
+    )
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """
+    Replace the LLM client with one that answers batch requests with a fixed reply.
+    """
+    reply = {}
+
+    async def create(**kwargs):
+        if isinstance(reply.get("content"), Exception):
+            raise reply["content"]
+        message = SimpleNamespace(content=reply["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(cli, "get_client", lambda: client)
+    cli.request_slots.cache_clear()
+    return reply
+
+
+def run_batch(fake_client, content) -> dict:
+    fake_client["content"] = content if isinstance(content, Exception) else json.dumps(content)
+    return asyncio.run(cli.query_batch({"a.py": "+a = 1", "b.py": "+b = 2"}, "model"))
+
+
+def test_shrink_diff_keeps_one_of_an_odd_number_of_files():
+    diff = "".join(file_diff(f"f{i}.py", "+" + "v" * 100) for i in range(3))
+    shrunk = cli.shrink_diff(diff, target_tokens=30)
+    assert shrunk.count("diff --git ") == 1
+    assert "[omitted 2 files with fewer changes]" in shrunk
+
+
+def test_shrink_diff_drops_many_small_files_to_fit():
+    diff = "".join(file_diff(f"f{i}.py", "+" + "v" * 100) for i in range(401))
+    assert len(cli.shrink_diff(diff)) <= cli.TARGET_TOKENS * 4
+
+
+def test_shrink_diff_clips_a_single_large_hunk():
+    shrunk = cli.shrink_diff(file_diff("a.py", *["+" + "x" * 1000] * 80))
+    assert len(shrunk) <= cli.TARGET_TOKENS * 4
+    assert "[truncated " in shrunk
+    shrunk = cli.shrink_diff(file_diff("a.py", "+" + "y" * 50000))
+    assert len(shrunk) <= cli.TARGET_TOKENS * 4
+    assert "[clipped 1 long lines]" in shrunk
+
+
+def test_shrink_diff_counts_markers_in_the_budget():
+    diff = "".join(file_diff(f"f{i}.py", *["+" + "w" * 150] * 80) for i in range(101))
+    assert len(cli.shrink_diff(diff)) <= cli.TARGET_TOKENS * 4
+
+
+def test_classify_locally_needs_file_headers():
+    assert cli.classify_locally("") is None
+    assert cli.classify_locally("diff --git c/a.py i/a.py\n@@ -0,0 +1 @@\n+x = 1\n") is None
+
+
+def test_classify_locally_whitespace_needs_hunks():
+    whitespace = file_diff("a.py", "-x  = 1", "+x = 1")
+    assert cli.classify_locally(whitespace) == ("style(a): fix whitespace", "")
+    binary = "diff --git a/a.bin b/a.bin\nBinary files a/a.bin and b/a.bin differ\n"
+    assert cli.classify_locally(binary) is None
+
+
+def test_query_batch_splits_multiline_titles(fake_client):
+    reply = {"messages": [{"id": 1, "title": "fix(a): x\n\nbody"}, {"id": 2, "title": "\n"}]}
+    assert run_batch(fake_client, reply) == {"a.py": ("fix(a): x", "body")}
+
+
+@pytest.mark.parametrize("number", [0, -1, 3, 1.9, True, None, "x"])
+def test_query_batch_skips_bad_ids(fake_client, number):
+    assert run_batch(fake_client, {"messages": [{"id": number, "title": "fix: x"}]}) == {}
+
+
+def test_query_batch_returns_nothing_on_api_error(fake_client):
+    error = openai.APIConnectionError(request=httpx.Request("POST", "https://example.com"))
+    assert run_batch(fake_client, error) == {}